@@ -2,19 +2,219 @@
 # NMEA File Builder
 # ------------------------------------------------------------
 # Provides utilities to convert calculated navigation paths
-# into NMEA-compliant GGA and VTG sentences for simulation.
-# Depends on 'pynmea2' for message construction.
+# into NMEA-compliant sentences for simulation. Sentence profiles
+# select GGA, VTG, RMC, ZDA, GSA and HDT output and their rates.
+# The single-sentence helpers depend on 'pynmea2'.
+#
+# Usage: python nmea_builder.py  (reports sentences per second
+# for each profile on a sample field)
 # ============================================================
 
 import math
+import numbers
 import numpy as np
 import pynmea2
 import datetime
+import functools
+import time
+
+# ------------------------------
+# Sentence profiles
+# ------------------------------
+# Each profile maps a sentence type to a rate divisor: a divisor of
+# n emits that sentence on every n-th sample, so at hz=10 a divisor
+# of 10 gives 1 Hz. Sentences within a sample follow profile order.
+SENTENCE_PROFILES = {
+    'default': {'GGA': 1, 'VTG': 1},
+    'rmc_zda': {'RMC': 1, 'ZDA': 1},
+    'gga_rmc': {'GGA': 1, 'RMC': 10},
+    'full': {'GGA': 1, 'VTG': 1, 'RMC': 1, 'ZDA': 1, 'GSA': 1, 'HDT': 1},
+}
+
+# Samples rendered per chunk by iter_nmea
+CHUNK_SAMPLES = 4096
+
+# Sentence fields; names in braces are filled from per-sample columns
+SENTENCE_FIELDS = {
+    'GGA': ('{time}', '{lat}', 'N', '{lon}', 'E',
+            '1', '12', '0.9', '300.00', 'M', '46.9', 'M', '', '0000'),
+    'VTG': ('{heading}', 'T', '{heading}', 'M', '{knots}', 'N', '{kmh}', 'K'),
+    'RMC': ('{time}', 'A', '{lat}', 'N', '{lon}', 'E',
+            '{knots}', '{heading}', '{date}', '', '', 'A'),
+    'ZDA': ('{time}', '{day}', '{month}', '{year}', '00', '00'),
+    'GSA': ('A', '3', '01', '02', '03', '04', '05', '06',
+            '07', '08', '09', '10', '11', '12', '1.5', '0.9', '1.2'),
+    'HDT': ('{heading}', 'T'),
+}
+
+def parse_profile(profile):
+    """
+    Resolve a profile name or 'GGA:1,RMC:10' specification.
+
+    :param profile: Profile name, specification string or dict
+    :return: dict of sentence type to rate divisor
+    """
+    if isinstance(profile, dict):
+        entries = list(profile.items())
+    elif profile in SENTENCE_PROFILES:
+        entries = list(SENTENCE_PROFILES[profile].items())
+    else:
+        entries = []
+        for entry in str(profile).split(','):
+            sentence, _, divisor = entry.strip().partition(':')
+            entries.append((sentence, int(divisor or 1)))
+
+    parsed = {}
+    for sentence, divisor in entries:
+        sentence = str(sentence).strip().upper()
+        if sentence not in SENTENCE_FIELDS:
+            raise ValueError(f"Unknown sentence type: {sentence}")
+        if sentence in parsed:
+            raise ValueError(f"Repeated sentence type: {sentence}")
+        if isinstance(divisor, bool) or not isinstance(divisor, numbers.Integral):
+            raise ValueError(f"Rate divisor must be an integer: {sentence}:{divisor!r}")
+        if divisor < 1:
+            raise ValueError(f"Rate divisor must be at least 1: {sentence}:{divisor}")
+        parsed[sentence] = int(divisor)
+    if not parsed:
+        raise ValueError("Profile must contain at least one sentence")
+
+    return parsed
+
+def compile_profile(profile):
+    """
+    Build the emitter for a profile, reusing recently compiled ones.
+
+    :param profile: Profile name, specification string or dict
+    :return: (emit function, set of required column names)
+    """
+    return _compile_emitter(tuple(parse_profile(profile).items()))
+
+@functools.lru_cache(maxsize=32)
+def _compile_emitter(profile):
+    """Compile a profile given as (sentence type, divisor) pairs."""
+    # Checksums of the constant text are folded in here; only the
+    # precomputed checksums of column values are XORed per sentence.
+    sentences = []
+    required_columns = set()
+    for sentence, divisor in profile:
+        fields = SENTENCE_FIELDS[sentence]
+        names = [field[1:-1] for field in fields if field.startswith('{')]
+        body = f"GP{sentence}," + ','.join(fields)
+        constant = nmea_checksum(body.format(**{name: '' for name in names}))
+        template = '$' + body.format(**{name: '{}' for name in names}) + '*{:02X}\n'
+        sentences.append((divisor, template.format, names, constant))
+        required_columns.update(names)
+
+    def emit(columns, first, count):
+        """Render `count` precomputed samples starting at sample `first`."""
+        texts, checksums = columns
+        bound = [
+            (divisor, render, [texts[name] for name in names], [checksums[name] for name in names], constant)
+            for divisor, render, names, constant in sentences
+        ]
+
+        lines = []
+        for i in range(count):
+            for divisor, render, text_columns, checksum_columns, constant in bound:
+                if (first + i) % divisor:
+                    continue
+                checksum = constant
+                for column in checksum_columns:
+                    checksum ^= column[i]
+                lines.append(render(*[column[i] for column in text_columns], checksum))
+
+        return ''.join(lines)
+
+    return emit, required_columns
+
+def nmea_checksum(text: str):
+    """XOR of all characters, as used by the NMEA checksum."""
+    checksum = 0
+    for byte in text.encode():
+        checksum ^= byte
+    return checksum
+
+# ------------------------------
+# Per-sample columns
+# ------------------------------
+def precompute_columns(path, origin, speed_kmh: float, times, names, first=0):
+    """
+    Calculate the text and checksum of every requested column once
+    per sample so that all sentences of a profile can share them.
+
+    :param path: List of (x, y) points in meters relative to origin
+    :param origin: [lat, lon] in degrees
+    :param speed_kmh: Speed in kilometers per hour
+    :param times: datetimes of samples path[first:first + len(times)]
+    :param names: Column names required by the profile
+    :param first: Index of the first sample to calculate
+    :return: (texts, checksums) dicts of per-sample lists
+    """
+    count = len(times)
+    texts = {}
+
+    if names & {'time', 'date', 'day', 'month', 'year'}:
+        if 'time' in names:
+            texts['time'] = [t.strftime("%H%M%S.%f")[:-4] for t in times]
+        if 'date' in names:
+            texts['date'] = [f'{t.day:02d}{t.month:02d}{t.year % 100:02d}' for t in times]
+        if 'day' in names:
+            texts['day'] = [f'{t.day:02d}' for t in times]
+        if 'month' in names:
+            texts['month'] = [f'{t.month:02d}' for t in times]
+        if 'year' in names:
+            texts['year'] = [str(t.year) for t in times]
+
+    # Include the neighbouring points needed for the heading
+    window_start = max(first - 1, 0)
+    points = np.array(path[window_start:first + count + 1], dtype=float).reshape(-1, 2)
+    offset = first - window_start
+    indices = np.arange(count) + offset
+
+    if names & {'lat', 'lon'}:
+        earth_radius_m = 6378137
+        latitudes = origin[0] + (points[indices, 1] / earth_radius_m) * (180 / math.pi)
+        longitudes = origin[1] + (points[indices, 0] / earth_radius_m) * (180 / math.pi) / math.cos(origin[0] * math.pi / 180)
+        texts['lat'] = format_degrees_minutes(latitudes)
+        texts['lon'] = format_degrees_minutes(longitudes)
+
+    if 'heading' in names:
+        point_prev = points[np.maximum(indices - 1, 0)]
+        point_after = points[np.minimum(indices + 1, len(points) - 1)]
+        ang1 = np.arctan2(1, 0)
+        ang2 = np.arctan2(point_after[:, 1] - point_prev[:, 1], point_after[:, 0] - point_prev[:, 0])
+        texts['heading'] = [str(angle) for angle in np.rad2deg((ang1 - ang2) % (2 * np.pi)).tolist()]
+
+    if 'knots' in names:
+        texts['knots'] = [str(speed_kmh / 1.852)] * count
+    if 'kmh' in names:
+        texts['kmh'] = [str(speed_kmh)] * count
+
+    # Repeated values (speed, date) are only checksummed once
+    checksums = {}
+    for name, column in texts.items():
+        known = {}
+        checksums[name] = [
+            known[text] if text in known else known.setdefault(text, nmea_checksum(text))
+            for text in column
+        ]
+
+    return texts, checksums
+
+def format_degrees_minutes(degrees):
+    """Format an array of degrees as NMEA (d)ddmm.mmmm strings."""
+    whole, minutes = np.divmod(np.abs(degrees) * 60, 60)
+    whole = (np.sign(degrees) * whole).astype(int).tolist()
+    return [
+        f'{h}0{m}' if m < 10 else f'{h}{m}'
+        for h, m in zip(whole, minutes.tolist())
+    ]
 
 # ------------------------------
 # Main NMEA file generation
 # ------------------------------
-def build_nmea(path, origin, speed_kmh: float, hz: int, nmea_file_path: str):
+def build_nmea(path, origin, speed_kmh: float, hz: int, nmea_file_path: str, profile='default'):
     """
     Generate an NMEA file from a path.
 
@@ -23,31 +223,79 @@ def build_nmea(path, origin, speed_kmh: float, hz: int, nmea_file_path: str):
     :param speed_kmh: Speed in kilometers per hour
     :param hz: Output frequency (messages per second)
     :param nmea_file_path: Destination file path
+    :param profile: Sentence profile name, specification or dict
     """
-    time = datetime.datetime.now()
-    speed_knots = speed_kmh / 1.852
-    time_step = 1 / hz
+    with open(nmea_file_path, 'w') as file:
+        file.writelines(iter_nmea(path, origin, speed_kmh, hz, profile=profile))
 
-    nmea_file = ''
+def create_nmea(path, origin, speed_kmh: float, hz: int, start_time=None, profile='default'):
+    """
+    Generate NMEA text for a path driven out and back.
 
-    path.extend(path[::-1])
+    :param path: List of (x, y) points in meters relative to origin
+    :param origin: [lat, lon] in degrees
+    :param speed_kmh: Speed in kilometers per hour
+    :param hz: Output frequency (messages per second)
+    :param start_time: datetime of the first sample (defaults to now)
+    :param profile: Sentence profile name, specification or dict
+    :return: NMEA sentences separated by newlines
+    """
+    return ''.join(iter_nmea(path, origin, speed_kmh, hz, start_time, profile))
 
-    for i, point in enumerate(path):
-        gga = create_gga(m_to_ll(point, origin), time.strftime("%H%M%S.%f")[:-4])
-        vtg = create_vtg(
-            path[max(0, i - 1)],
-            path[min(len(path) - 1, i + 1)],
-            speed_kmh,
-            speed_knots
-        )
+def iter_nmea(path, origin, speed_kmh: float, hz: int, start_time=None, profile='default'):
+    """
+    Generate NMEA text for a path driven out and back in chunks of
+    CHUNK_SAMPLES samples, so large files can be streamed to disk.
 
-        nmea_file += str(gga) + '\n'
-        nmea_file += str(vtg) + '\n'
+    :param path: List of (x, y) points in meters relative to origin
+    :param origin: [lat, lon] in degrees
+    :param speed_kmh: Speed in kilometers per hour
+    :param hz: Output frequency (messages per second)
+    :param start_time: datetime of the first sample (defaults to now)
+    :param profile: Sentence profile name, specification or dict
+    :return: Iterator of NMEA text chunks
+    """
+    emit, required_columns = compile_profile(profile)
 
-        time += datetime.timedelta(seconds=time_step)
+    path = list(path) + list(path[::-1])
+    sample_time = start_time if start_time is not None else datetime.datetime.now()
+    time_step = datetime.timedelta(seconds=1 / hz)
 
-    with open(nmea_file_path, 'w') as file:
-        file.write(nmea_file)
+    for first in range(0, len(path), CHUNK_SAMPLES):
+        count = min(CHUNK_SAMPLES, len(path) - first)
+        times = []
+        for _ in range(count):
+            times.append(sample_time)
+            sample_time += time_step
+
+        columns = precompute_columns(path, origin, speed_kmh, times, required_columns, first)
+        yield emit(columns, first, count)
+
+def measure_throughput(path, origin, speed_kmh: float, hz: int, profiles=None):
+    """
+    Time NMEA generation for each profile.
+
+    :param path: List of (x, y) points in meters relative to origin
+    :param origin: [lat, lon] in degrees
+    :param speed_kmh: Speed in kilometers per hour
+    :param hz: Output frequency (messages per second)
+    :param profiles: Profile names or dict of name to profile (defaults to all)
+    :return: dict of profile name to (sentences, sentences per second)
+    """
+    if profiles is None:
+        profiles = SENTENCE_PROFILES
+    if not isinstance(profiles, dict):
+        profiles = {name: name for name in profiles}
+
+    results = {}
+    for name, profile in profiles.items():
+        compile_profile(profile)
+        started = time.perf_counter()
+        sentences = create_nmea(path, origin, speed_kmh, hz, profile=profile).count('\n')
+        elapsed = time.perf_counter() - started
+        results[name] = (sentences, sentences / elapsed if elapsed > 0 else float('inf'))
+
+    return results
 
 # ------------------------------
 # Coordinate conversion
@@ -112,3 +360,13 @@ def create_vtg(point_prev, point_after, speed_kmh, speed_knots):
         str(angle), 'T', str(angle), 'M',
         str(speed_knots), 'N', str(speed_kmh), 'K'
     ))
+
+if __name__ == '__main__':
+    import field_calculator
+
+    sample_field = [(0, 0), (200, 0), (200, 400), (0, 400), (0, 0)]
+    sample_bounds, _ = field_calculator.create_bounding_box(sample_field, 0)
+    sample_path = field_calculator.calculate_path(sample_bounds, 8, 25, 30.0, 0, 10)
+
+    for name, (sentences, rate) in measure_throughput(sample_path, [52.0, 5.0], 30.0, 10).items():
+        print(f'{name:<10} {sentences:>8} sentences {rate:>12,.0f} sentences/s')
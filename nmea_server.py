@@ -0,0 +1,354 @@
+# ============================================================
+# NMEA Generation Service
+# ------------------------------------------------------------
+# Headless HTTP front end to 'field_calculator' and 'nmea_builder'
+# for test rigs. Accepts a TASKDATA XML field plus path parameters
+# and streams back the simulated NMEA file.
+#
+# Results are stored in an on-disk cache addressed by a hash of the
+# request, identical in-flight requests share one computation, and
+# path generation runs in a process pool so the server stays
+# responsive. Depends on 'bottle' and 'gevent'.
+#
+# Usage: python nmea_server.py --port 8080 --cache-dir nmea_cache
+# ============================================================
+
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.parsers.expat import ExpatError
+
+import bottle
+from gevent.pywsgi import WSGIServer
+
+import field_calculator
+import nmea_builder
+
+CACHE_VERSION = 1
+DEFAULT_START_TIME = datetime.datetime(2000, 1, 1)
+MAX_PASSES = 200
+MAX_SAMPLES = 500000
+MAX_SENTENCES = 2000000
+STALE_TEMP_SECONDS = 3600
+
+app = bottle.Bottle()
+
+cache_dir = 'nmea_cache'
+cache_max_bytes = 1024 * 1024 * 1024
+executor = None
+worker_count = None
+in_flight = {}
+
+class FieldError(Exception):
+    """Raised by a worker when the submitted field cannot be processed."""
+
+# ------------------------------
+# Request parameters
+# ------------------------------
+def parse_params(query):
+    """
+    Validate query parameters and return them in canonical form.
+    Mirrors the GUI inputs: passes take precedence over pass width.
+    """
+    def number(name, default, cast=float):
+        value = query.get(name)
+        if value is None or value == '':
+            return default
+        try:
+            result = cast(value)
+        except ValueError:
+            bottle.abort(400, f"Invalid value for '{name}': {value}")
+        if not math.isfinite(result):
+            bottle.abort(400, f"Invalid value for '{name}': {value}")
+        return result
+
+    params = {
+        'passes': number('passes', None, int),
+        'pass_width': number('pass_width', None),
+        'speed': number('speed', 30.0),
+        'hz': number('hz', 10, int),
+        'start': query.get('start') or DEFAULT_START_TIME.isoformat(),
+    }
+
+    heading = query.get('heading') or '0'
+    params['heading'] = 'ab' if heading.lower() == 'ab' else number('heading', 0.0)
+
+    if params['passes'] is None and params['pass_width'] is None:
+        params['passes'] = 8
+    if params['passes'] is not None:
+        params['pass_width'] = None
+
+    try:
+        # Kept as pairs so the cache key preserves sentence order
+        params['profile'] = list(nmea_builder.parse_profile(query.get('profile') or 'default').items())
+    except ValueError as error:
+        bottle.abort(400, f"Invalid value for 'profile': {error}")
+
+    try:
+        params['start'] = datetime.datetime.fromisoformat(params['start']).isoformat()
+    except ValueError:
+        bottle.abort(400, f"Invalid value for 'start': {params['start']}")
+
+    if params['passes'] is not None and not 1 <= params['passes'] <= MAX_PASSES:
+        bottle.abort(400, f"'passes' must be between 1 and {MAX_PASSES}")
+    if params['pass_width'] is not None and params['pass_width'] <= 0:
+        bottle.abort(400, "'pass_width' must be positive")
+    if params['speed'] <= 0 or params['hz'] < 1:
+        bottle.abort(400, "'speed' and 'hz' must be positive")
+
+    return params
+
+def cache_key(xml_data: bytes, params: dict):
+    """Return the content address of a request."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, params], sort_keys=True).encode())
+    digest.update(b'\0')
+    digest.update(xml_data)
+    return digest.hexdigest()
+
+def cache_file(key: str):
+    """Cache file path relative to the cache directory."""
+    return os.path.join(key[:2], key + '.nmea')
+
+# ------------------------------
+# Worker (runs in the process pool)
+# ------------------------------
+def generate(xml_data: bytes, params: dict, destination: str):
+    """
+    Calculate the path for a field and atomically write its NMEA file.
+    Any failure other than writing to disk is reported as a FieldError.
+    """
+    try:
+        path_points, field_origin = prepare_path(xml_data, params)
+        chunks = nmea_builder.iter_nmea(
+            path_points, field_origin, params['speed'], params['hz'],
+            datetime.datetime.fromisoformat(params['start']), dict(params['profile'])
+        )
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.writelines(chunks)
+            os.replace(temp_path, destination)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+    except (FieldError, OSError):
+        raise
+    except Exception as error:
+        raise FieldError(f"Could not generate NMEA: {error!r}") from None
+
+def prepare_path(xml_data: bytes, params: dict):
+    """
+    Follow the same steps as the GUI import, rejecting requests whose
+    output would exceed MAX_PASSES, MAX_SAMPLES or MAX_SENTENCES.
+    """
+    try:
+        field_outer_points, _, field_origin, ab_line_angle = field_calculator.import_xml(io.BytesIO(xml_data))
+        heading = ab_line_angle if params['heading'] == 'ab' else params['heading']
+        field_bound_points, field_width = field_calculator.create_bounding_box(field_outer_points, heading)
+    except (ExpatError, KeyError, ValueError, IndexError) as error:
+        raise FieldError(f"Invalid field XML: {error}") from None
+
+    passes, pass_width = params['passes'], params['pass_width']
+    if passes is not None:
+        pass_width = math.ceil((field_width / passes) * 100) / 100
+    else:
+        passes = math.ceil(field_width / pass_width)
+    if passes > MAX_PASSES:
+        raise FieldError(f"'pass_width' {params['pass_width']} needs more than {MAX_PASSES} passes for this field")
+
+    field_length = math.dist(field_bound_points[0], field_bound_points[3])
+    path_length = (field_length * passes) + ((math.pi * pass_width / 2) * (passes - 1))
+    samples = path_length * params['hz'] / (params['speed'] / 3.6)
+    if not samples <= MAX_SAMPLES:
+        raise FieldError(f"Path would need more than {MAX_SAMPLES} samples at 'hz' {params['hz']} and 'speed' {params['speed']}")
+
+    # The path is driven out and back, doubling the samples written
+    sentences = 2 * samples * sum(1 / divisor for _, divisor in params['profile'])
+    if sentences > MAX_SENTENCES:
+        raise FieldError(f"Output would have more than {MAX_SENTENCES} sentences, reduce 'hz' or the 'profile' rates")
+
+    path_points = field_calculator.calculate_path(
+        field_bound_points, passes, pass_width, params['speed'], heading, params['hz']
+    )
+    if not path_points:
+        raise FieldError("Field has no area to drive")
+
+    return path_points, field_origin
+
+def prune_cache():
+    """
+    Delete least recently used files until the cache fits cache_max_bytes,
+    along with temporary files left behind by workers that died.
+    """
+    entries = []
+    stale_before = time.time() - STALE_TEMP_SECONDS
+    for directory, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            with contextlib.suppress(OSError):
+                stat = os.stat(path)
+                if name.endswith('.nmea'):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                elif name.endswith('.tmp') and stat.st_mtime < stale_before:
+                    os.remove(path)
+
+    if not cache_max_bytes:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache_max_bytes:
+            break
+        with contextlib.suppress(OSError):
+            os.remove(path)
+            total -= size
+
+# ------------------------------
+# HTTP routes
+# ------------------------------
+def serve(key: str, cache_status: str):
+    """Stream a cached NMEA file and mark it as recently used."""
+    with contextlib.suppress(OSError):
+        os.utime(os.path.join(cache_dir, cache_file(key)))
+    download = 'simulated_path.nmea' if bottle.request.query.get('download') else False
+    response = bottle.static_file(cache_file(key), root=cache_dir, mimetype='text/plain', download=download)
+    response.set_header('X-Cache', cache_status)
+    response.set_header('X-Cache-Key', key)
+    return response
+
+def start_executor():
+    """Create the process pool used for generation."""
+    return ProcessPoolExecutor(max_workers=worker_count, mp_context=multiprocessing.get_context('spawn'))
+
+def submit(future, retries: int, *args):
+    """Run generate in the pool and relay its outcome to a placeholder."""
+    pool = executor
+    try:
+        work = pool.submit(generate, *args)
+    except BrokenProcessPool as error:
+        recover(future, pool, retries, args, error)
+        return
+    work.add_done_callback(lambda done: relay(done, future, pool, retries, args))
+
+def relay(done, future, pool, retries: int, args):
+    """Copy the outcome of a pool future to a waiting placeholder."""
+    if done.cancelled():
+        future.cancel()
+    elif isinstance(done.exception(), BrokenProcessPool):
+        recover(future, pool, retries, args, done.exception())
+    elif done.exception() is not None:
+        future.set_exception(done.exception())
+    else:
+        future.set_result(done.result())
+
+def recover(future, pool, retries: int, args, error):
+    """
+    Replace a pool whose worker died, then retry the job or fail it.
+    Only the first caller for a given broken pool replaces it.
+    """
+    global executor
+
+    if executor is pool:
+        executor = start_executor()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if retries > 0:
+        submit(future, retries - 1, *args)
+    else:
+        future.set_exception(error)
+
+@app.post('/nmea')
+def post_nmea():
+    """
+    Generate an NMEA file for the TASKDATA XML in the request body.
+    Query parameters: passes | pass_width, speed, heading (degrees or 'ab'),
+    hz, start (ISO timestamp of the first sample), profile, download.
+    """
+    params = parse_params(bottle.request.query)
+    xml_data = bottle.request.body.read()
+    if not xml_data:
+        bottle.abort(400, 'Request body must contain the field XML')
+
+    key = cache_key(xml_data, params)
+    if os.path.exists(os.path.join(cache_dir, cache_file(key))):
+        return serve(key, 'HIT')
+
+    future = in_flight.get(key)
+    cache_status = 'COALESCED'
+    if future is None:
+        # Register before submitting: starting a pool worker yields to the hub
+        future = Future()
+        in_flight[key] = future
+        future.add_done_callback(lambda _: in_flight.pop(key, None))
+        cache_status = 'MISS'
+        try:
+            submit(future, 1, xml_data, params, os.path.join(cache_dir, cache_file(key)))
+        except Exception as error:
+            future.set_exception(error)
+            raise
+
+    try:
+        future.result()
+    except FieldError as error:
+        bottle.abort(400, str(error))
+    except BrokenProcessPool:
+        bottle.abort(503, 'Worker process failed, please retry the request')
+
+    # The response already holds the file open, so pruning cannot remove it
+    response = serve(key, cache_status)
+    if cache_status == 'MISS':
+        prune_cache()
+    return response
+
+@app.get('/nmea/<key:re:[0-9a-f]{64}>')
+def get_nmea(key):
+    """Fetch a previously generated file by its cache key."""
+    if not os.path.exists(os.path.join(cache_dir, cache_file(key))):
+        bottle.abort(404, 'Unknown cache key')
+    return serve(key, 'HIT')
+
+# ------------------------------
+# Entry point
+# ------------------------------
+def run(host: str, port: int, directory: str, workers: int, cache_max_mb: int):
+    """Start the worker pool and serve until interrupted."""
+    global cache_dir, cache_max_bytes, executor, worker_count
+
+    cache_dir = os.path.abspath(directory)
+    cache_max_bytes = cache_max_mb * 1024 * 1024
+    os.makedirs(cache_dir, exist_ok=True)
+    worker_count = workers
+    executor = start_executor()
+
+    try:
+        WSGIServer((host, port), app).serve_forever()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DF Nav - NMEA generation service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cache-dir', default='nmea_cache')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--cache-max-mb', type=int, default=1024, help='0 disables pruning')
+    args = parser.parse_args()
+
+    run(args.host, args.port, args.cache_dir, args.workers, args.cache_max_mb)
@@ -0,0 +1,93 @@
+# ============================================================
+# NMEA Builder Tests
+# ------------------------------------------------------------
+# Checks the compiled profile emitters against the pynmea2
+# sentence helpers and validates checksums and rate divisors.
+#
+# Usage: python -m pytest
+# ============================================================
+
+import datetime
+
+import pynmea2
+import pytest
+
+import field_calculator
+import nmea_builder
+
+START_TIME = datetime.datetime(2024, 12, 31, 23, 59, 50)
+
+def sample_path(heading, hz):
+    """Path over a skewed quadrilateral field."""
+    field = [(0, 0), (200, 30), (180, 400), (-10, 390), (0, 0)]
+    bounds, _ = field_calculator.create_bounding_box(field, heading)
+    return field_calculator.calculate_path(bounds, 4, 33.3, 27.0, heading, hz)
+
+def reference_nmea(path, origin, speed_kmh, hz):
+    """GGA+VTG output built one pynmea2 object per sentence."""
+    time = START_TIME
+    lines = []
+    path = path + path[::-1]
+    for i, point in enumerate(path):
+        lines.append(str(nmea_builder.create_gga(nmea_builder.m_to_ll(point, origin), time.strftime("%H%M%S.%f")[:-4])))
+        lines.append(str(nmea_builder.create_vtg(
+            path[max(0, i - 1)], path[min(len(path) - 1, i + 1)], speed_kmh, speed_kmh / 1.852
+        )))
+        time += datetime.timedelta(seconds=1 / hz)
+    return ''.join(line + '\n' for line in lines)
+
+@pytest.mark.parametrize('origin, heading, hz', [
+    ([52.1, 5.3], 0, 10),
+    ([-33.9, -70.6], 17, 3),
+    ([0.0001, -0.0001], 90, 10),
+    ([64.2, 179.9], 243.5, 5),
+])
+def test_default_profile_matches_pynmea2(origin, heading, hz):
+    path = sample_path(heading, hz)
+    expected = reference_nmea(path, origin, 27.0, hz).splitlines(keepends=True)
+    actual = nmea_builder.create_nmea(path, origin, 27.0, hz, START_TIME, 'default').splitlines(keepends=True)
+
+    # Compared per line to keep failure output readable
+    assert len(actual) == len(expected)
+    for i, (line, expected_line) in enumerate(zip(actual, expected)):
+        assert line == expected_line, f'line {i}'
+
+def test_every_sentence_type_has_valid_checksum():
+    path = sample_path(17, 10)
+    lines = nmea_builder.create_nmea(path, [-33.9, -70.6], 27.0, 10, START_TIME, 'full').splitlines()
+
+    sentence_types = set()
+    for line in lines:
+        sentence_types.add(pynmea2.parse(line, check=True).sentence_type)
+    assert sentence_types == set(nmea_builder.SENTENCE_FIELDS)
+
+def test_gga_rmc_divisor_spacing():
+    path = sample_path(0, 10)
+    lines = nmea_builder.create_nmea(path, [52.1, 5.3], 27.0, 10, START_TIME, 'gga_rmc').splitlines()
+
+    gga_times = [line.split(',')[1] for line in lines if line.startswith('$GPGGA')]
+    rmc_times = [line.split(',')[1] for line in lines if line.startswith('$GPRMC')]
+    assert len(gga_times) == 2 * len(path)
+    assert rmc_times == gga_times[::10]
+
+    # Each RMC follows the GGA of the same sample
+    for i, line in enumerate(lines):
+        if line.startswith('$GPRMC'):
+            assert lines[i - 1].split(',')[1] == line.split(',')[1]
+
+@pytest.mark.parametrize('profile', ['default', 'gga_rmc', 'full'])
+def test_chunked_output_matches_single_chunk(monkeypatch, profile):
+    path = sample_path(17, 10)
+    monkeypatch.setattr(nmea_builder, 'CHUNK_SAMPLES', 10 ** 9)
+    expected = nmea_builder.create_nmea(path, [52.1, 5.3], 27.0, 10, START_TIME, profile)
+
+    # Chunk size coprime with the RMC divisor to cross chunk boundaries mid-period
+    monkeypatch.setattr(nmea_builder, 'CHUNK_SAMPLES', 7)
+    chunks = list(nmea_builder.iter_nmea(path, [52.1, 5.3], 27.0, 10, START_TIME, profile))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == expected
+
+@pytest.mark.parametrize('profile', ['GGA:1,GGA:10', 'XXX:1', 'GGA:0', {'GGA': '1'}, {}])
+def test_invalid_profiles_raise_value_error(profile):
+    with pytest.raises(ValueError):
+        nmea_builder.parse_profile(profile)
@@ -0,0 +1,229 @@
+# ============================================================
+# NMEA Generation Service Tests
+# ------------------------------------------------------------
+# Drives the bottle app through its WSGI interface with an
+# inline TASKDATA field. Pool executors are replaced by stubs
+# that run jobs in-process.
+#
+# Usage: python -m pytest
+# ============================================================
+
+import io
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from wsgiref.util import setup_testing_defaults
+
+import gevent
+import pytest
+
+import nmea_server
+
+FIELD_XML = b'''<ISO11783_TaskData><PFD A="PFD1"><PLN A="1"><LSG A="1">
+<PNT A="2" C="52.0000" D="5.0000"/><PNT A="2" C="52.0000" D="5.0030"/>
+<PNT A="2" C="52.0040" D="5.0030"/><PNT A="2" C="52.0040" D="5.0000"/>
+<PNT A="2" C="52.0000" D="5.0000"/></LSG></PLN>
+<LSG A="5"><PNT A="2" C="52.0000" D="5.0000"/><PNT A="2" C="52.0040" D="5.0010"/></LSG>
+</PFD></ISO11783_TaskData>'''
+
+POINT_XML = b'''<ISO11783_TaskData><PFD A="PFD1"><PLN A="1"><LSG A="1">
+<PNT A="2" C="52.0" D="5.0"/></LSG></PLN></PFD></ISO11783_TaskData>'''
+
+class InlineExecutor:
+    """Runs jobs as soon as they are submitted."""
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+class DeferredExecutor(InlineExecutor):
+    """Holds jobs until run_all is called."""
+    def __init__(self):
+        super().__init__()
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        # Starting a pool worker yields to the hub
+        gevent.sleep(0)
+        self.submitted += 1
+        future = Future()
+        self.jobs.append((fn, args, future))
+        return future
+
+    def run_all(self):
+        for fn, args, future in self.jobs:
+            future.set_result(fn(*args))
+
+class BrokenExecutor(InlineExecutor):
+    """Fails every job as if its worker process had died."""
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        return future
+
+@pytest.fixture(autouse=True)
+def server(monkeypatch, tmp_path):
+    monkeypatch.setattr(nmea_server, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(nmea_server, 'executor', InlineExecutor())
+    monkeypatch.setattr(nmea_server, 'in_flight', {})
+
+def call(method, path, query='', body=b''):
+    """Return (status code, headers, body) for a request to the app."""
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_TYPE': 'application/xml',
+        'wsgi.input': io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+
+    response = {}
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split()[0])
+        response['headers'] = dict(headers)
+
+    result = nmea_server.app(environ, start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], content
+
+def post(query, body=FIELD_XML):
+    return call('POST', '/nmea', query, body)
+
+# ------------------------------
+# Cache keys
+# ------------------------------
+@pytest.mark.parametrize('first, second', [
+    ('passes=2&speed=30', 'passes=2&speed=30.0'),
+    ('passes=2&profile=gga_rmc', 'passes=2&profile=GGA:1,RMC:10'),
+    ('passes=2&profile=gga_rmc', 'passes=2&profile=gga:1, rmc:10'),
+    ('passes=2', 'passes=2&start=2000-01-01'),
+    ('passes=2', 'passes=2&start=2000-01-01T00:00'),
+    ('passes=2&pass_width=3', 'passes=2&pass_width=5'),
+])
+def test_equivalent_requests_share_cache_key(first, second):
+    status, headers, body = post(first)
+    assert (status, headers['X-Cache']) == (200, 'MISS')
+
+    status, repeat_headers, repeat_body = post(second)
+    assert (status, repeat_headers['X-Cache']) == (200, 'HIT')
+    assert repeat_headers['X-Cache-Key'] == headers['X-Cache-Key']
+    assert repeat_body == body
+
+@pytest.mark.parametrize('first, second', [
+    ('passes=2', 'passes=3'),
+    ('passes=2', 'passes=2&profile=full'),
+    ('passes=2&profile=GGA:1,RMC:10', 'passes=2&profile=RMC:10,GGA:1'),
+    ('passes=2', 'passes=2&start=2000-01-02'),
+])
+def test_different_requests_get_different_keys(first, second):
+    assert post(first)[1]['X-Cache-Key'] != post(second)[1]['X-Cache-Key']
+
+def test_get_by_cache_key():
+    _, headers, body = post('passes=2')
+
+    status, get_headers, get_body = call('GET', '/nmea/' + headers['X-Cache-Key'])
+    assert (status, get_headers['X-Cache'], get_body) == (200, 'HIT', body)
+
+    assert call('GET', '/nmea/' + '0' * 64)[0] == 404
+    assert call('GET', '/nmea/not-a-key')[0] == 404
+
+# ------------------------------
+# Coalescing and worker failures
+# ------------------------------
+def test_concurrent_identical_requests_are_coalesced(monkeypatch):
+    executor = DeferredExecutor()
+    monkeypatch.setattr(nmea_server, 'executor', executor)
+
+    requests = [gevent.spawn(post, 'passes=2') for _ in range(4)]
+    gevent.sleep(0.1)
+    assert executor.submitted == 1
+
+    executor.run_all()
+    gevent.joinall(requests, timeout=10)
+    statuses = sorted(request.value[1]['X-Cache'] for request in requests)
+    assert statuses == ['COALESCED', 'COALESCED', 'COALESCED', 'MISS']
+    assert nmea_server.in_flight == {}
+
+def test_broken_pool_is_replaced_and_job_retried(monkeypatch):
+    monkeypatch.setattr(nmea_server, 'executor', BrokenExecutor())
+    monkeypatch.setattr(nmea_server, 'start_executor', InlineExecutor)
+
+    status, headers, _ = post('passes=2')
+    assert (status, headers['X-Cache']) == (200, 'MISS')
+    assert isinstance(nmea_server.executor, InlineExecutor)
+
+def test_broken_pool_twice_returns_503(monkeypatch):
+    monkeypatch.setattr(nmea_server, 'executor', BrokenExecutor())
+    monkeypatch.setattr(nmea_server, 'start_executor', BrokenExecutor)
+
+    assert post('passes=2')[0] == 503
+
+    # The next request gets a fresh pool
+    monkeypatch.setattr(nmea_server, 'start_executor', InlineExecutor)
+    assert post('passes=2')[0] == 200
+
+# ------------------------------
+# Rejected requests
+# ------------------------------
+@pytest.mark.parametrize('query', [
+    'passes=0', 'passes=201', 'passes=x', 'pass_width=-1',
+    'speed=nan', 'speed=inf', 'speed=0', 'heading=nan', 'hz=0',
+    'profile=XXX', 'profile=GGA:1,GGA:2', 'profile=GGA:0', 'start=bad',
+])
+def test_invalid_parameters_return_400(query):
+    executor = nmea_server.executor
+    assert post(query)[0] == 400
+    assert executor.submitted == 0
+
+@pytest.mark.parametrize('query, body', [
+    ('passes=2', b''),
+    ('passes=2', b'<not xml'),
+    ('passes=2', POINT_XML),
+    ('pass_width=1e-300', FIELD_XML),
+    ('passes=2&speed=1e-300', FIELD_XML),
+    ('passes=200&speed=30&hz=90&profile=full', FIELD_XML),
+])
+def test_unusable_fields_return_400(tmp_path, query, body):
+    status, _, content = post(query, body)
+    assert status == 400
+    assert len(content) < 2000
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names]
+
+def test_sentence_limit_accounts_for_profile(monkeypatch):
+    monkeypatch.setattr(nmea_server, 'MAX_SENTENCES', 500)
+    assert post('passes=2&hz=1&profile=GGA:1')[0] == 200
+    assert post('passes=2&hz=1&profile=full')[0] == 400
+
+# ------------------------------
+# Cache size
+# ------------------------------
+def test_cache_is_pruned_least_recently_used_first(monkeypatch, tmp_path):
+    first = post('passes=2')[1]['X-Cache-Key']
+    second = post('passes=3')[1]['X-Cache-Key']
+    os.utime(tmp_path / nmea_server.cache_file(first), (1, 1))
+    os.utime(tmp_path / nmea_server.cache_file(second), (2, 2))
+
+    size = os.path.getsize(tmp_path / nmea_server.cache_file(second))
+    monkeypatch.setattr(nmea_server, 'cache_max_bytes', size * 2)
+    third = post('passes=2&hz=5')[1]['X-Cache-Key']
+
+    assert not os.path.exists(tmp_path / nmea_server.cache_file(first))
+    assert os.path.exists(tmp_path / nmea_server.cache_file(second))
+    assert os.path.exists(tmp_path / nmea_server.cache_file(third))
@@ -17,6 +17,7 @@ import nmea_builder
 from tkinter import *
 from tkinter.ttk import Progressbar
 from tkinter.filedialog import askopenfilename, asksaveasfilename
+from tkinter.messagebox import showerror
 
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -133,6 +134,12 @@ import_button.grid(row=0, column=0, padx=25, pady=50)
 # ------------------------------
 def export_nmea(*input):
     """Save calculated path as an NMEA simulation file."""
+    try:
+        profile = nmea_builder.parse_profile(sentences_entry.get())
+    except ValueError as error:
+        showerror('Invalid Sentences', str(error))
+        return
+
     nmea_file_path = asksaveasfilename(
         initialfile='simulated_path',
         initialdir="/",
@@ -140,7 +147,7 @@ def export_nmea(*input):
         filetypes=[("NMEA Files", "*.nmea")]
     ) + '.nmea'
 
-    nmea_builder.build_nmea(path_points, field_origin, float(speed_entry.get()), hz, nmea_file_path)
+    nmea_builder.build_nmea(path_points, field_origin, float(speed_entry.get()), hz, nmea_file_path, profile)
 
 export_button = Button(button_frame, text='Export NMEA', command=export_nmea)
 export_button.grid(row=0, column=1, padx=25, pady=50)
@@ -261,6 +268,41 @@ custom_direction_entry.grid(row=5, column=1, padx=25, pady=10)
 custom_direction_entry.bind("<Return>", custom_direction_enter)
 custom_direction_entry.insert(0, '0')
 
+# ------------------------------
+# Sentence Profile Selection
+# ------------------------------
+def sentences_option_change(*input):
+    """Fill in the sentence rates of the selected profile."""
+    if sentences_variable.get() == 'Custom':
+        return
+
+    profile = nmea_builder.SENTENCE_PROFILES[sentences_variable.get()]
+    sentences_entry.delete(0, END)
+    sentences_entry.insert(0, ','.join(f'{sentence}:{divisor}' for sentence, divisor in profile.items()))
+
+def sentences_enter(input):
+    """Switch to custom sentence mode."""
+    sentences_variable.set(sentences_options[-1])
+
+sentences_label = Label(input_frame, text='Sentences:')
+sentences_label.grid(row=6, column=0, padx=25, pady=10)
+
+sentences_options = list(nmea_builder.SENTENCE_PROFILES) + ['Custom']
+sentences_variable = StringVar(input_frame)
+sentences_variable.set(sentences_options[0])
+
+sentences_menu = OptionMenu(input_frame, sentences_variable, *sentences_options, command=sentences_option_change)
+sentences_menu.config(width=8)
+sentences_menu.grid(row=6, column=1, padx=25, pady=10)
+
+sentences_rates_label = Label(input_frame, text='Rates (1/n of Hz)')
+sentences_rates_label.grid(row=7, column=0, padx=25, pady=10)
+
+sentences_entry = Entry(input_frame, justify='right', width=10)
+sentences_entry.grid(row=7, column=1, padx=25, pady=10)
+sentences_entry.bind("<Return>", sentences_enter)
+sentences_option_change()
+
 # ------------------------------
 # Application Exit Handling
 # ------------------------------